@@ -5,6 +5,8 @@ Also contains methods for extracting metadata (geospatial/temporal).
 
 import logging
 
+import numpy as np
+
 from io import envi
 from metadata import product
 from _dataset import _geospatial
@@ -22,6 +24,20 @@ class ENVI(_geospatial):
         self.path = path
         self.unpack_fmt = unpack_fmt
 
+    def __enter__(self):
+        self._load_data()
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def read(self):
+        """
+        Load (if not already loaded) and return data from the binary file
+        """
+        self._load_data()
+        return self.data
+
     def _load_data(self):
         """
         Load data from the binary file into a class attribute "data"
@@ -42,24 +58,30 @@ class ENVI(_geospatial):
 
     def get_geospatial(self):
         """
-        Read geospatial data parsed from binary file
+        Read geospatial data parsed from binary file. Files with more than
+        one pixel per line give one value per pixel, in line order.
         :return dict: A dict containing geospatial information
         """
         spatial = {
-            "lat": self.data[1],
-            "lon": self.data[2],
-            "alt": self.data[3],
-            "roll": self.data[4],
-            "pitch": self.data[5],
-            "heading": self.data[6]
+            "lat": np.ravel(self.data[1]),
+            "lon": np.ravel(self.data[2]),
+            "alt": np.ravel(self.data[3]),
+            "roll": np.ravel(self.data[4]),
+            "pitch": np.ravel(self.data[5]),
+            "heading": np.ravel(self.data[6])
         }
 
         return spatial
 
     def get_temporal(self):
+        """
+        Read the times of the first and last pixels from the binary file
+        :return dict: A dict containing temporal information
+        """
+        times = np.ravel(self.data[0])
         temporal = {
-            "start_time": self.data[0][0],
-            "end_time": self.data[0][-1],
+            "start_time": times[0],
+            "end_time": times[-1],
         }
 
         return temporal
@@ -112,17 +134,6 @@ class BIL(ENVI):
                               unpack_fmt=self.unpack_fmt)
         self.path = self.b.path
 
-    def __enter__(self):
-        self.read()
-        return self
-
-    def __exit__(self, *args):
-        pass
-
-    def read(self):
-        self._load_data()
-        return self.data
-
 
 class BSQ(ENVI):
     """
@@ -139,14 +150,3 @@ class BSQ(ENVI):
                               path=self.path,
                               unpack_fmt=self.unpack_fmt)
         self.path = self.b.path
-
-    def __enter__(self):
-        self.data = self.read()
-        return self
-
-    def __exit__(self, *args):
-        pass
-
-    def read(self):
-        self._load_data()
-        return self.data
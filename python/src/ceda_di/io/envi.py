@@ -13,6 +13,8 @@ import os
 import stat
 import struct
 
+import numpy as np
+
 
 class EnviFile(object):
     """
@@ -44,6 +46,13 @@ class EnviFile(object):
         if not "pixperline" in self.hdr:
             self.calc_from_xy()
 
+    def __enter__(self):
+        self.data = self.read()
+        return self
+
+    def __exit__(self, *args):
+        pass
+
     def check_valid_fmt_string(self):
         """
         Check the format string for validity.
@@ -116,12 +125,15 @@ class EnviFile(object):
 
     def read(self, x_size, y_size, z_size):
         """
-        Read an ENVI binary file incrementally, returning arrays containing
-        binary data.
+        Read an ENVI binary file in a single pass, returning an array
+        containing binary data.
 
         :param x_size: Number of bands (BIL) || Number of lines (BSQ)
         :param y_size: Number of lines (BIL) || Number of bands (BSQ)
         :param z_size: Pixels per line
+        :return ndarray: Array of shape (x_size, y_size), or
+                         (x_size, y_size, z_size) if there is more than one
+                         pixel per line
         """
         filename = self.path
 
@@ -141,27 +153,25 @@ class EnviFile(object):
         if checknum != 1:
             raise ValueError("File size and supplied attributes do not match")
 
+        try:
+            dtype = np.dtype(self.unpack_fmt)
+        except TypeError:
+            raise ValueError("Supplied format \"%s\" is not supported" %
+                             str(self.unpack_fmt))
+
+        count = x_size * y_size * z_size
         with open(filename, 'rb') as envi:
-            # Pre-allocate list
-            data = []
-            for i in xrange(0, x_size):
-                data.append([])
-                data[i] = [[] for j in xrange(0, y_size)]
-
-            for y in xrange(0, y_size):
-                for x in xrange(0, x_size):
-                    for z in xrange(0, z_size):
-                        # Read one data item (pixel) from the data file.
-                        datum = envi.read(bytesperpix)
-
-                        # If we get a blank string then we hit EOF unexpectedly
-                        if datum == "":
-                            raise EOFError("Unexpected EOF :(")
-
-                        # If everything worked, unpack the binary value
-                        # and store it in the appropriate pixel value
-                        data[x][y] = \
-                            struct.unpack(self.unpack_fmt, datum)[0]
+            raw = np.fromfile(envi, dtype=dtype, count=count)
+
+        # If we read short then we hit EOF unexpectedly
+        if raw.size < count:
+            raise EOFError("Unexpected EOF :(")
+
+        # Data is stored in (y, x, z) order on disk
+        data = np.ascontiguousarray(
+            raw.reshape(y_size, x_size, z_size).transpose(1, 0, 2))
+        if z_size == 1:
+            data = data[:, :, 0]
 
         return data
 
@@ -180,13 +190,6 @@ class BilFile(EnviFile):
             path = super(BilFile, self).get_path(header_path, self.extension)
         super(BilFile, self).__init__(header_path, path, unpack_fmt)
 
-    def __enter__(self):
-        self.data = self.read()
-        return self
-
-    def __exit__(self, *args):
-        pass
-
     def read(self):
         """
         Read BIL file (reading bytes in correct order)
@@ -211,13 +214,6 @@ class BsqFile(EnviFile):
 
         super(BsqFile, self).__init__(header_path, path, unpack_fmt)
 
-    def __enter__(self):
-        self.data = self.read()
-        return self
-
-    def __exit__(self, *args):
-        pass
-
     def read(self):
         """
         Read BSQ file (reading bytes in correct order)
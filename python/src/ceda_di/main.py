@@ -33,6 +33,43 @@ class HandlerFactory(object):
                 return handler(filename)
 
 
+# Handler factory for the current worker process (see _init_worker)
+_HANDLER_FACTORY = None
+
+
+def _init_worker(handler_map):
+    """
+    Set up a worker process with its own handler factory.
+    :param dict handler_map: Filename pattern to handler class mapping
+    """
+    global _HANDLER_FACTORY
+    _HANDLER_FACTORY = HandlerFactory(handler_map)
+
+
+def _process_one(path):
+    """
+    Extract metadata from a single file in a worker process.
+    The document is encoded in the worker, so only bytes are sent back.
+
+    :param str path: Path to the data file
+    :return tuple: (path, JSON document) - document is None if the file
+                   has no handler or metadata could not be extracted
+    """
+    try:
+        handler = _HANDLER_FACTORY.get(path)
+        if handler is not None:
+            with handler as hand:
+                props = hand.get_properties()
+
+            if props is not None:
+                return (path, props.as_bytes())
+    except Exception:
+        logging.getLogger(__name__).exception(
+            "Could not extract metadata from %s", path)
+
+    return (path, None)
+
+
 class Main(object):
     """
     Main script to start processing of data files in ceda-di.
@@ -51,10 +88,21 @@ class Main(object):
             self.numcores = self.conf["numcores"]
             self.datapath = self.conf["datapath"]
             self.outpath = self.conf["outputpath"]
-            self.handler_factory = HandlerFactory(self.conf["handlers"])
+
+            # Workers build their own factories (see _init_worker); this
+            # one only checks every handler imports, so a bad "handlers"
+            # entry fails here rather than in each worker process
+            HandlerFactory(self.conf["handlers"])
 
             self.jsonpath = os.path.join(self.conf["outputpath"],
                                     self.conf["jsonpath"])
+
+            # Optional single newline-delimited JSON file for all documents
+            bulkfile = self.conf.get("bulkfile")
+            if bulkfile:
+                self.bulkpath = os.path.join(self.outpath, bulkfile)
+            else:
+                self.bulkpath = None
         except KeyError as k:
             sys.stderr.write("Missing configuration option: %s\n\n" % str(k))
 
@@ -101,29 +149,18 @@ class Main(object):
 
         return log
 
-    def process_file(self, filename):
+    def write_document(self, fname, doc):
         """
-        Instantiate a handler for a file and extract metadata.
+        Write an already-encoded JSON document to the output file for a
+        data file.
         """
-        handler = self.handler_factory.get(filename)
-        if handler is not None:
-            with handler as hand:
-                self.write_properties(filename, hand)
-
-    def write_properties(self, fname, _geospatial_obj):
-        """
-        Write module properties to an output file.
-        """
-
         fname = os.path.basename(fname)
 
         # Construct JSON path
         fname = "%s/%s.json" % (self.jsonpath, os.path.splitext(fname)[0])
 
-        props = _geospatial_obj.get_properties()
-        if props is not None:
-            with open(fname, 'w') as j:
-                j.write(str(props))
+        with open(fname, 'wb') as j:
+            j.write(doc)
 
     def run(self):
         """
@@ -138,27 +175,36 @@ class Main(object):
         data_files = []
         for root, _, files in os.walk(self.datapath, followlinks=True):
             for each_file in files:
-                data_files.append((root, each_file))
-
-        if len(data_files) > 0:
-            # Process files
-            pool = []
-
-            for f in data_files:
-                path = os.path.join(*f)
+                path = os.path.join(root, each_file)
                 if "raw" not in path:
-                    p = multiprocessing.Process(target=self.process_file,
-                                                args=(path,))
-                    pool.append(p)
-                    p.start()
-
-            while len(pool) >= self.numcores:
-                for p in pool:
-                    if p.exitcode is not None:
-                        pool.remove(p)
-
-        for p in pool:
-            p.join()
+                    data_files.append(path)
+
+        # Process files - documents are encoded by the workers and only
+        # written out here, in batches of 32 files per worker round-trip
+        pool = multiprocessing.Pool(self.numcores,
+                                    initializer=_init_worker,
+                                    initargs=(self.conf["handlers"],))
+        bulk = None
+        try:
+            if self.bulkpath is not None:
+                bulk = open(self.bulkpath, "wb")
+
+            for path, doc in pool.imap_unordered(_process_one, data_files,
+                                                 chunksize=32):
+                if doc is None:
+                    continue
+
+                if bulk is not None:
+                    # One document per line, written as soon as it arrives
+                    bulk.write(doc)
+                    bulk.write("\n")
+                else:
+                    self.write_document(path, doc)
+        finally:
+            pool.close()
+            pool.join()
+            if bulk is not None:
+                bulk.close()
 
         # Log end of processing
         end = datetime.datetime.now()
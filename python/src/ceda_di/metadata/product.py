@@ -3,33 +3,113 @@ Module for holding and exporting file metadata as JSON documents.
 """
 
 from __future__ import division
+import datetime
 import hashlib
 import json
 import logging
-import math
-from pyhull.convex_hull import qconvex
+
+import numpy as np
+
+try:
+    from scipy.spatial import ConvexHull
+    try:
+        from scipy.spatial import QhullError
+    except ImportError:
+        from scipy.spatial.qhull import QhullError
+except ImportError:
+    # Fall back to pyhull's text-based Qhull interface
+    ConvexHull = None
+    from pyhull.convex_hull import qconvex
+
+try:
+    from bottleneck import nanmax, nanmin
+except ImportError:
+    from numpy import nanmax, nanmin
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+_LOG = logging.getLogger(__name__)
+
+# Valid coordinate ranges, in degrees
+LAT_MIN, LAT_MAX = -90, 90
+LON_MIN, LON_MAX = -180, 180
+
+# Inputs at least this long are filtered by the compiled loop (when numba is
+# available), as smaller ones do not repay the cost of calling into it
+JIT_FILTER_THRESHOLD = 10000
+
+
+def _filter_coords_loop(lats, lons):
+    """
+    Single-pass filter keeping only the (lat, lon) pairs where both values
+    are in range. Intended to be compiled with numba.
+    :param ndarray lats: Contiguous float64 array of latitudes
+    :param ndarray lons: Contiguous float64 array of longitudes
+    :return tuple: (lats, lons) arrays of valid pairs
+    """
+    num = min(len(lats), len(lons))
+    out_lats = np.empty(num, dtype=np.float64)
+    out_lons = np.empty(num, dtype=np.float64)
+
+    count = 0
+    for i in range(num):
+        lat = lats[i]
+        lon = lons[i]
+        if LAT_MIN <= lat <= LAT_MAX and LON_MIN <= lon <= LON_MAX:
+            out_lats[count] = lat
+            out_lons[count] = lon
+            count += 1
+
+    return out_lats[:count], out_lons[:count]
+
+
+if njit is not None:
+    _filter_coords_jit = njit(cache=True)(_filter_coords_loop)
+else:
+    _filter_coords_jit = None
 
 
 class Properties(object):
     """
     A class to hold, manipulate, and export geospatial metadata at file level.
     """
+    __slots__ = ("filesystem", "temporal", "data_format", "parameters",
+                 "spatial", "misc", "properties")
+
+    GEOMETRIES = ("bbox", "summary", "hull")
+
     def __init__(self, filesystem=None, spatial=None,
                  temporal=None, data_format=None, parameters=None,
-                 **kwargs):
+                 geometries=("bbox", "summary"), **kwargs):
         """
         Construct a 'ceda_di.metadata.Properties' ready to export as JSON or dict
         (see "doc/schema.json")
 
         :param dict filesystem: Filesystem information about file
-        :param dict spatial: Spatial information about file
+        :param dict spatial: Spatial information about file; "lat" and "lon"
+                             are best given as float64 ndarrays, which are
+                             used without copying
         :param dict temporal: Temporal information about file
         :param dict data_format: Data format information about file
         :param list parameters: Parameter objects in list
+        :param tuple geometries: Names of the geometries to generate from
+                                 "spatial" (any of Properties.GEOMETRIES).
+                                 "hull" is a Polygon, or a MultiPoint when
+                                 the points enclose no area.
         :param **kwargs: Key-value pairs of any extra relevant metadata.
         """
-
-        self.logger = logging.getLogger(__name__)
+        unknown = set(geometries) - set(self.GEOMETRIES)
+        if unknown:
+            raise ValueError("Unknown geometry type(s): %s" %
+                             ", ".join(sorted(unknown)))
 
         self.filesystem = filesystem
         self.temporal = temporal
@@ -42,13 +122,14 @@ class Properties(object):
 
         self.spatial = spatial
         if self.spatial is not None:
-            self.spatial["lat"] = filter(self.valid_lat, self.spatial["lat"])
-            self.spatial["lon"] = filter(self.valid_lon, self.spatial["lon"])
-            self.spatial = self._to_geojson(self.spatial)
+            lats = np.ascontiguousarray(self.spatial["lat"], dtype=np.float64)
+            lons = np.ascontiguousarray(self.spatial["lon"], dtype=np.float64)
+            self.spatial = self._to_geojson({"lat": lats, "lon": lons},
+                                            geometries)
 
         self.misc = kwargs
         self.properties = {
-            "_id": hashlib.sha1(self.filesystem["path"]).hexdigest(),
+            "_id": self._gen_id(self.filesystem["path"]),
             "data_format": self.data_format,
             "file": self.filesystem,
             "misc": self.misc,
@@ -57,6 +138,55 @@ class Properties(object):
             "temporal": self.temporal,
         }
 
+    @staticmethod
+    def _gen_id(path):
+        """
+        Generate a document ID from a file path.
+        :param str path: Path to file (byte string or unicode)
+        :return str: Hex digest of the SHA-1 hash of the UTF-8 encoded path
+        """
+        if isinstance(path, unicode):
+            path = path.encode("utf-8")
+
+        return hashlib.sha1(path).hexdigest()
+
+    @staticmethod
+    def _filter_axis(values, low, high):
+        """
+        Drop values outside [low, high] (and NaNs) from a single axis.
+        :param ndarray values: Array of coordinate values
+        :param float low: Lowest valid value
+        :param float high: Highest valid value
+        :return ndarray: Array of valid values
+        """
+        with np.errstate(invalid="ignore"):  # NaNs are simply dropped
+            return values[(values >= low) & (values <= high)]
+
+    @staticmethod
+    def _filter_coords(lats, lons):
+        """
+        Drop any (lat, lon) pair where either coordinate is invalid, keeping
+        the two arrays aligned point-for-point.
+        :param ndarray lats: Contiguous float64 array of latitudes (of any
+                             shape; multi-dimensional arrays are flattened)
+        :param ndarray lons: Contiguous float64 array of longitudes
+        :return tuple: (lats, lons) 1-D arrays of valid pairs
+        """
+        # Flattening a contiguous array gives a view, not a copy, and lets
+        # both paths below work on 1-D input
+        lats, lons = lats.ravel(), lons.ravel()
+
+        num = min(len(lats), len(lons))
+        if _filter_coords_jit is not None and num >= JIT_FILTER_THRESHOLD:
+            return _filter_coords_jit(lats, lons)
+
+        lats, lons = lats[:num], lons[:num]
+        with np.errstate(invalid="ignore"):  # NaNs are simply dropped
+            valid = ((lats >= LAT_MIN) & (lats <= LAT_MAX) &
+                     (lons >= LON_MIN) & (lons <= LON_MAX))
+
+        return lats[valid], lons[valid]
+
     @staticmethod
     def valid_lat(num):
         """
@@ -64,9 +194,7 @@ class Properties(object):
         :param float num: Number to test
         :return: True if 'num' is valid, else False
         """
-        if num < -90 or num > 90:
-            return False
-        return True
+        return LAT_MIN <= num <= LAT_MAX
 
     @staticmethod
     def valid_lon(num):
@@ -75,21 +203,21 @@ class Properties(object):
         :param float num: Number to test
         :return: True if 'num' is valid, else False
         """
-        if num < -180 or num > 180:
-            return False
-        return True
+        return LON_MIN <= num <= LON_MAX
 
     def _gen_bbox(self, coord_list):
         """
         Generate and return a bounding box for the given geospatial data.
-        :param dict coord_list: Dictionary with "lat" and "lon" lists
+        :param dict coord_list: Dictionary with pre-filtered "lat" and "lon"
+                                arrays (which need not be the same length,
+                                e.g. the axes of a grid)
         :return dict bbox: A bounding-box formatted in the GeoJSON style
         """
         lons = coord_list["lon"]
         lats = coord_list["lat"]
 
-        lon_lo, lon_hi = self._get_min_max(lons, filter_func=self.valid_lon)
-        lat_lo, lat_hi = self._get_min_max(lats, filter_func=self.valid_lat)
+        lon_lo, lon_hi = float(nanmin(lons)), float(nanmax(lons))
+        lat_lo, lat_hi = float(nanmin(lats)), float(nanmax(lats))
 
         bbox = {
             "type": "MultiPoint",
@@ -101,34 +229,114 @@ class Properties(object):
 
         return bbox
 
-    def _gen_hull(self, coord_list):
+    @staticmethod
+    def _thin_coords(points, cell_size=0.01):
         """
-        Generate and return a convex hull for the given geospatial data.
-        :param list coord_list: Normalised and uniquified set of coordinates
-        :return dict chul: A convex hull formatted in the GeoJSON style
+        Reduce a set of points to one point per grid cell. Most points in a
+        flight track are interior to its hull, so thinning them first makes
+        the hull much cheaper while moving it by less than one cell.
+
+        :param ndarray points: (N, 2) array of (lon, lat) coordinates
+        :param float cell_size: Grid cell size, in degrees
+        :return ndarray: (M, 2) array holding one point per occupied cell
         """
+        cells = np.floor(points / cell_size).astype(np.int32)
 
-        chull = {
-            "type": "Polygon"
-        }
+        # View each pair of int32 cell indices as a single int64 key
+        keys = np.ascontiguousarray(cells).view(np.int64).ravel()
+        _, keep = np.unique(keys, return_index=True)
 
-        qhull_output = qconvex('p', coord_list)
+        return points[keep]
+
+    @staticmethod
+    def _hull_ring(points):
+        """
+        Return the vertices of the convex hull of the given points in
+        counter-clockwise order, or None if the points are flat (collinear).
+        :param ndarray points: (N, 2) array of (lon, lat) coordinates
+        :return ndarray: (M, 2) array of hull vertices
+        """
+        if ConvexHull is not None:
+            try:
+                hull = ConvexHull(points)
+            except QhullError:
+                return None
+
+            # 2-D hull vertices are already in counter-clockwise order
+            return points[hull.vertices]
+
+        qhull_output = qconvex('p', points.tolist())
         hull_coords = []
         for point in qhull_output[2:]:
-            coords = point.split(" ")
+            coords = point.split()
             try:
                 hull_coords.append((float(coords[0]), float(coords[1])))
-            except ValueError as val:
-                self.logger.error("Cannot convert to float: (%s) [%s]",
-                                  val, str(coords))
+            except (ValueError, IndexError) as val:
+                _LOG.error("Cannot convert to float: (%s) [%s]",
+                           val, str(coords))
+
+        # qconvex prints no vertices when the points are flat
+        if len(hull_coords) < 3:
+            return None
+
+        # qconvex lists vertices in no particular order, so sort them
+        # counter-clockwise by angle around their centre
+        ring = np.array(hull_coords, dtype=np.float64)
+        offsets = ring - ring.mean(axis=0)
+        return ring[np.argsort(np.arctan2(offsets[:, 1], offsets[:, 0]))]
+
+    def _gen_hull(self, coord_list):
+        """
+        Generate and return a convex hull for the given geospatial data, as
+        a GeoJSON Polygon with a single closed, counter-clockwise ring.
+        Points that enclose no area give a MultiPoint (see _gen_extremes).
+        :param coord_list: Normalised and uniquified (lon, lat) coordinates,
+                           as a list of pairs or an (N, 2) array
+        :return dict chull: A convex hull formatted in the GeoJSON style
+        """
+        points = np.asarray(coord_list, dtype=np.float64)
+
+        # Try the thinned points first; thinning can leave too few points,
+        # or collinear ones, even when the full set has a hull
+        candidates = [points]
+        thinned = self._thin_coords(points)
+        if len(thinned) >= 4:
+            candidates.insert(0, thinned)
+
+        for candidate in candidates:
+            ring = self._hull_ring(candidate)
+            if ring is not None:
+                return {
+                    "type": "Polygon",
+                    "coordinates": [np.vstack([ring, ring[:1]]).tolist()]
+                }
+
+        return self._gen_extremes(points)
+
+    @staticmethod
+    def _gen_extremes(coord_list):
+        """
+        Stand-in for a convex hull when the points are too few or lie on a
+        line: returns every point if there are fewer than four, otherwise
+        the two end points along the axis of greatest spread.
+        :param ndarray coord_list: (N, 2) array of unique (lon, lat) points
+        :return dict extremes: A point set formatted in the GeoJSON style
+        """
+        if len(coord_list) >= 4:
+            axis = np.ptp(coord_list, axis=0).argmax()
+            ends = [coord_list[:, axis].argmin(), coord_list[:, axis].argmax()]
+            coord_list = coord_list[ends]
 
-        chull["coordinates"] = hull_coords
-        return chull
+        return {
+            "type": "MultiPoint",
+            "coordinates": coord_list.tolist()
+        }
 
     def _gen_coord_summary(self, coord_list):
         """
-        Pull 30 evenly-spaced coordinates from a given list
-        :param list coord_list: Normalised and unique set of coordinates
+        Pull 30 evenly-spaced coordinates (including the first and last)
+        from the given arrays, or every coordinate if there are fewer.
+        :param dict coord_list: Dictionary with "lat" and "lon" arrays
         :return dict summ: A summary formatted in the GeoJSON style
         """
 
@@ -140,33 +348,34 @@ class Properties(object):
         lons = coord_list["lon"]
         lats = coord_list["lat"]
 
-        step = int(math.ceil(len(lons) / num_points))
-        lons = lons[::step]
-        lats = lats[::step]
+        num_coords = min(len(lons), len(lats))
+        idx = np.linspace(0, num_coords - 1, min(num_points, num_coords),
+                          dtype=np.intp)
 
-        summ["coordinates"] = zip(lons, lats)
+        summ["coordinates"] = np.column_stack([lons[idx], lats[idx]]).tolist()
 
         return summ
 
     @staticmethod
-    def _get_min_max(item_list, filter_func=None):
+    def _unique_coords(first, second):
         """
-        Return a tuple containing the (highest, lowest) values in the list.
-        :param list item_list: List of comparable data items
-        :param function filter_func: Function that returns True for good values
-        :return tuple: Tuple of (highest, lowest values in the list)
+        Pair up two coordinate sequences and remove duplicate pairs.
+
+        :param first: Sequence of first coordinate values (e.g. lats)
+        :param second: Sequence of second coordinate values (e.g. lons)
+        :return ndarray: Sorted (N, 2) array of unique coordinate pairs
         """
-        if len(item_list) < 1:
-            return (None, None)
+        first = np.asarray(first, dtype=np.float64)
+        second = np.asarray(second, dtype=np.float64)
 
-        # Filter out ignore_value (useful for _FillValue, etc)
-        if filter_func is not None:
-            item_list = [i for i in item_list if filter_func(i)]
+        num = min(len(first), len(second))
+        coords = np.column_stack([first[:num], second[:num]])
 
-        high = max(item_list)
-        low = min(item_list)
+        # View each row as one 16-byte record so np.unique compares pairs
+        pairs = coords.view([("first", np.float64), ("second", np.float64)])
+        uniq = np.unique(pairs.ravel())
 
-        return (low, high)
+        return uniq.view(np.float64).reshape(-1, 2)
 
     @staticmethod
     def _to_wkt(spatial):
@@ -176,47 +385,104 @@ class Properties(object):
         :param dict spatial: A dict with keys 'lat' and 'lon' (as lists)
         :return: A Python string representing a WKT linestring
         """
-        lats = spatial["lat"]
-        lons = spatial["lon"]
-
-        coord_list = set()
-        for lat, lon in zip(lats, lons):
-            coord_list.add("%f %f" % (lat, lon))
+        coords = Properties._unique_coords(spatial["lat"], spatial["lon"])
 
+        # Build one format string for every pair and fill it in one call
         sep = ", "
-        coord_string = sep.join(coord_list)
+        coord_fmt = sep.join(["%f %f"] * len(coords))
+        coord_string = coord_fmt % tuple(coords.ravel().tolist())
         linestring = "LINESTRING (%s)" % coord_string
 
         return linestring
 
-    def _to_geojson(self, spatial):
+    def _to_geojson(self, spatial, geometries=("bbox", "summary")):
         """
         Convert lats and lons to a GeoJSON-compatible type.
 
-        :param dict spatial: A dict with keys 'lat' and 'lon' (as lists)
+        The bounding box uses every valid value on each axis. The summary
+        and hull use only (lat, lon) pairs where both values are valid, and
+        are left out if there are none.
+        The hull is a Polygon, or a MultiPoint of the points themselves
+        when they cannot enclose any area (see _gen_extremes).
+
+        :param dict spatial: A dict with keys 'lat' and 'lon' (as unfiltered
+                             float64 arrays)
+        :param tuple geometries: Names of the geometries to generate
         :return: A Python dict representing a GeoJSON-compatible coord array
         """
-        lats = spatial["lat"]
-        lons = spatial["lon"]
+        axes = {
+            "lat": self._filter_axis(spatial["lat"], LAT_MIN, LAT_MAX),
+            "lon": self._filter_axis(spatial["lon"], LON_MIN, LON_MAX)
+        }
+
+        if len(axes["lat"]) > 0 and len(axes["lon"]) > 0:
+            lats, lons = self._filter_coords(spatial["lat"], spatial["lon"])
+            pairs = {"lat": lats, "lon": lons}
+
+            geoms = {}
+            if "bbox" in geometries:
+                geoms["bbox"] = self._gen_bbox(axes)
+
+            # Without a single valid pair, the summary and hull would be
+            # empty geometries, which are not valid GeoJSON
+            has_pairs = len(lats) > 0
+
+            if "summary" in geometries and has_pairs:
+                geoms["summary"] = self._gen_coord_summary(pairs)
+            if "hull" in geometries and has_pairs:
+                coords = self._unique_coords(lons, lats)
+
+                # Skip Qhull when the points cannot enclose any area: too
+                # few of them, or all on one parallel or meridian (other
+                # straight lines are caught by _gen_hull)
+                if len(coords) < 4 or np.ptp(coords, axis=0).min() <= 1e-6:
+                    geoms["hull"] = self._gen_extremes(coords)
+                else:
+                    geoms["hull"] = self._gen_hull(coords)
 
-        if len(lats) > 0 and len(lons) > 0:
             geojson = {
-                "geometries": {
-                    "bbox": self._gen_bbox(spatial),
-                    "summary" : self._gen_coord_summary(spatial)
-                }
+                "geometries": geoms
             }
 
             return geojson
         return None
 
+    @staticmethod
+    def _sanitize(obj):
+        """
+        Recursively convert a metadata structure to plain Python types that
+        every encoder handles natively: NumPy scalars and arrays become
+        numbers and lists, dates become ISO 8601 strings, tuples and sets
+        become lists and anything unrecognised becomes its repr().
+
+        :param obj: Object to convert
+        :return: Equivalent structure of dicts, lists, strings and numbers
+        """
+        if obj is None or isinstance(obj, (basestring, bool)):
+            return obj
+        if isinstance(obj, np.generic):
+            return obj.item()
+        if isinstance(obj, (int, long, float)):
+            return obj
+        if isinstance(obj, dict):
+            return dict((k, Properties._sanitize(v))
+                        for k, v in obj.iteritems())
+        if isinstance(obj, (list, tuple, set, frozenset)):
+            return [Properties._sanitize(i) for i in obj]
+        if isinstance(obj, np.ndarray):
+            return obj.tolist()
+        if isinstance(obj, (datetime.date, datetime.time)):
+            return obj.isoformat()
+
+        return repr(obj)
+
     def __str__(self):
         """
         Format file properties to JSON when coercing object to string.
 
         :return: A Python string containing JSON representation of object.
         """
-        return json.dumps(self.properties, default=repr)
+        return json.dumps(self._sanitize(self.properties))
 
     def as_json(self):
         """
@@ -226,6 +492,33 @@ class Properties(object):
         """
         return self.__str__()
 
+    def as_bytes(self):
+        """
+        Return metadata as a UTF-8 encoded JSON document, ready to be
+        written to a binary file or sent to Elasticsearch.
+
+        :return str: UTF-8 encoded JSON document describing metadata.
+        """
+        doc = self.__str__()
+        if isinstance(doc, unicode):
+            doc = doc.encode("utf-8")
+
+        return doc
+
+    def as_msgpack(self):
+        """
+        Return metadata as a MessagePack document. This is smaller and
+        cheaper to produce than JSON, as numbers are packed in binary.
+
+        :return str: MessagePack-encoded document describing metadata.
+        """
+        if msgpack is None:
+            raise ImportError("MessagePack output requires \"msgpack\"")
+
+        # Byte strings hold text in Python 2, so pack them as strings
+        return msgpack.packb(self._sanitize(self.properties),
+                             use_bin_type=False)
+
     def as_dict(self):
         """
         Return metadata as dict object.
@@ -241,6 +534,8 @@ class Parameter(object):
     :param str name: Name of variable/parameter
     :param dict other_params: Optional - Dict containing other param metadata
     """
+    __slots__ = ("items", "name")
+
     def __init__(self, name, other_params=None):
         self.items = []
         self.name = name
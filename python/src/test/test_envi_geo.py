@@ -4,11 +4,15 @@ Test module for ceda_di.envi_geo
 
 import unittest
 
+import numpy as np
+
 from ceda_di.envi_geo import BIL
 from ceda_di.envi_geo import BSQ
 from ceda_di.envi_geo import ENVI
 from ceda_di.metadata.product import Parameter
 
+from .test_io_envi import EnviFileMixin
+
 class ENVIStub(object):
     """Stub ENVI object"""
     def __init__(self, **kwargs):
@@ -34,10 +38,10 @@ class TestENVI(unittest.TestCase):
         envi.b = self.envi_stub
         envi._load_data()
 
-        assert envi.get_parameters()[0].__dict__ == \
-                    Parameter("velocity").__dict__
-        assert envi.get_parameters()[1].__dict__ == \
-                    Parameter("spam").__dict__
+        params = envi.get_parameters()
+        for param, name in zip(params, ["velocity", "spam"]):
+            assert param.name == name
+            assert param.get() == Parameter(name).get()
 
     def test_get_geospatial(self):
         envi = ENVI(self.path)
@@ -45,8 +49,8 @@ class TestENVI(unittest.TestCase):
         envi._load_data()
 
         geosp = envi.get_geospatial()
-        assert geosp["lat"] == ["lat"]
-        assert geosp["lon"] == ["lon"]
+        assert geosp["lat"].tolist() == ["lat"]
+        assert geosp["lon"].tolist() == ["lon"]
 
     def test_get_temporal(self):
         envi = ENVI(self.path, path=self.path)
@@ -66,3 +70,42 @@ class TestENVI(unittest.TestCase):
     def test_bsq_get_data_format(self):
         bsq = BSQ(self.path)
         assert bsq.get_data_format() == "ENVI BSQ (Band Sequential)"
+
+
+class TestBILBSQ(EnviFileMixin, unittest.TestCase):
+    """Test class for ceda_di.envi_geo.BIL and BSQ on real files"""
+    def setUp(self):
+        super(TestBILBSQ, self).setUp()
+
+        # 7 bands (time, lat, lon, ...) of 3 lines
+        self.bands = np.array([[1, 2, 3], [50, 51, 52], [-1, -2, -3],
+                               [0, 0, 0], [0, 0, 0], [0, 0, 0], [0, 0, 0]],
+                              dtype="<d")
+
+    def test_bil_without_context(self):
+        bil = BIL(self.write_file("nav.bil"))
+        props = bil.get_properties().as_dict()
+
+        assert props["temporal"] == {"start_time": 1, "end_time": 3}
+        assert props["spatial"]["geometries"]["bbox"]["coordinates"] == \
+            [[-3, 50], [-3, 52], [-1, 52], [-1, 50]]
+
+    def test_bil_pixels_per_line(self):
+        # 2 pixels per line: times 0-5 and positions are stored per pixel
+        self.bands = np.zeros((7, 3, 2))
+        self.bands[0] = np.arange(6).reshape(3, 2)
+        self.bands[1] = [[50, 50.5], [51, 51.5], [52, 52.5]]
+        self.bands[2] = [[-1, -1.5], [-2, -2.5], [-3, -3.5]]
+
+        props = BIL(self.write_file("nav.bil")).get_properties().as_dict()
+        assert props["temporal"] == {"start_time": 0, "end_time": 5}
+        assert props["spatial"]["geometries"]["bbox"]["coordinates"] == \
+            [[-3.5, 50], [-3.5, 52.5], [-1, 52.5], [-1, 50]]
+
+        summary = props["spatial"]["geometries"]["summary"]["coordinates"]
+        assert summary[:2] == [[-1, 50], [-1.5, 50.5]]
+
+    def test_bsq_context(self):
+        with BSQ(self.write_file("nav.bsq")) as bsq:
+            assert bsq.data is not None
+            assert bsq.read() is bsq.data
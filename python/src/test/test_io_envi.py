@@ -0,0 +1,84 @@
+"""
+Test module for ceda_di.io.envi
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from ceda_di.io.envi import BilFile, BsqFile
+
+
+class EnviFileMixin(object):
+    """
+    Mixin for test cases that need real ENVI files: writes 'self.bands', a
+    (bands, lines) or (bands, lines, pixels) array set by the test case,
+    into a temporary directory.
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_file(self, name):
+        """
+        Write 'self.bands' to an ENVI binary file and header, interleaved to
+        match the extension of 'name' (".bil" or ".bsq").
+        :param str name: Name of the binary file
+        :return str: Path to the header file
+        """
+        path = os.path.join(self.tmpdir, name)
+        with open(path + ".hdr", "w") as hdr:
+            hdr.write("ENVI\nbands = %d\nlines = %d\n" %
+                      self.bands.shape[:2])
+
+        if name.endswith(".bil"):
+            # BIL stores each line's band values together
+            data = self.bands.swapaxes(0, 1)
+        else:
+            # BSQ stores each band's values together
+            data = self.bands
+
+        np.ascontiguousarray(data).tofile(path)
+        return path + ".hdr"
+
+
+class TestEnviFile(EnviFileMixin, unittest.TestCase):
+    """Test class for ceda_di.io.envi.BilFile and BsqFile"""
+    def setUp(self):
+        super(TestEnviFile, self).setUp()
+
+        # 7 bands of 4 lines, 1 pixel per line
+        self.bands = np.arange(28, dtype="<d").reshape(7, 4)
+
+    def test_read_bil(self):
+        data = BilFile(self.write_file("nav.bil")).read()
+
+        assert isinstance(data, np.ndarray)
+        assert np.array_equal(data, self.bands)
+
+    def test_read_bil_pixels(self):
+        # 2 pixels per line give a third axis
+        self.bands = np.arange(56, dtype="<d").reshape(7, 4, 2)
+        bil = BilFile(self.write_file("nav.bil"))
+
+        assert bil.hdr["pixperline"] == 2
+        assert np.array_equal(bil.read(), self.bands)
+
+    def test_read_bsq(self):
+        # BSQ is read back as line-major
+        data = BsqFile(self.write_file("nav.bsq")).read()
+
+        assert np.array_equal(data, self.bands.T)
+
+    def test_read_truncated(self):
+        bil = BilFile(self.write_file("nav.bil"))
+        bil.hdr["lines"] = "5"
+        bil.hdr["filesize"] = 7 * 5 * 8
+
+        with self.assertRaises(EOFError):
+            bil.read()
@@ -51,13 +51,12 @@ class Test_NetCDF_Base(unittest.TestCase):
         self.nc_stub.add_variable("spam",
                              {"nobody expects": "the spanish inquisition"})
 
-        assert NetCDF_Base.params(self.nc_stub)[0].__dict__ == {
-            "name": "spam",
-            "items": [{
-                "name": "nobody expects",
-                 "value": "the spanish inquisition"
-            }]
-        }
+        param = NetCDF_Base.params(self.nc_stub)[0]
+        assert param.name == "spam"
+        assert param.get() == [{
+            "name": "nobody expects",
+            "value": "the spanish inquisition"
+        }]
 
     @unittest.skip
     def test_get_temporal(self):
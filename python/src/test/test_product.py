@@ -2,14 +2,29 @@
 Test module for ceda_di.metadata.product
 """
 
+import datetime
+import json
 import unittest
 
+import numpy as np
+
+from ceda_di.metadata import product
 from ceda_di.metadata.product import Properties, Parameter
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    from pyhull.convex_hull import qconvex
+except ImportError:
+    qconvex = None
+
 class TestProperties(unittest.TestCase):
     def setUp(self):
         # Just some dummy data (totally arbitrary)
-        fs = {"size": 3}
+        fs = {"path": "/path/to/spam", "size": 3}
         tmp = {"start_time": "2014-09-22T20:51:53Z",
                "end_time": "2014-09-22T20:51:53Z"}
         df = {"data_format": "spam"}
@@ -33,13 +48,312 @@ class TestProperties(unittest.TestCase):
     def test_gen_bbox(self):
         # Arbitrary data ahoy
         spatial = {
-            "lat": [3, 4, 5],
-            "lon": [5, 4, 3]
+            "lat": np.array([3, 4, 5], dtype=np.float64),
+            "lon": np.array([5, 4, 3], dtype=np.float64)
         }
 
         assert self.prop._gen_bbox(spatial) == {
             "type": "MultiPoint",
-            "coordinates": [[3, 3], [3, 5], [5, 3], [5, 5]]
+            "coordinates": [[3, 3], [3, 5], [5, 5], [5, 3]]
+        }
+
+    def test_grid_axes(self):
+        # Gridded data: lat and lon are separate axes of different lengths
+        sp = {"lat": np.arange(-89.5, 90), "lon": np.arange(-179.5, 180)}
+        prop = Properties(filesystem={"path": "/path/to/eggs"}, spatial=sp)
+
+        bbox = prop.spatial["geometries"]["bbox"]["coordinates"]
+        assert bbox == [[-179.5, -89.5], [-179.5, 89.5],
+                        [179.5, 89.5], [179.5, -89.5]]
+
+        # Invalid values are dropped from each axis on its own
+        sp = {"lat": [10, 95, 20, 30], "lon": [40, -200, 50]}
+        prop = Properties(filesystem={"path": "/path/to/eggs"}, spatial=sp)
+
+        bbox = prop.spatial["geometries"]["bbox"]["coordinates"]
+        assert bbox == [[40, 10], [40, 30], [50, 30], [50, 10]]
+
+    def test_invalid_coords_filtered(self):
+        sp = {"lat": [10, 95, -20, 5], "lon": [-200, 30, 40, 35]}
+        prop = Properties(filesystem={"path": "/path/to/eggs"}, spatial=sp)
+
+        bbox = prop.spatial["geometries"]["bbox"]["coordinates"]
+        assert bbox == [[30, -20], [30, 10], [40, 10], [40, -20]]
+
+        # The summary only keeps pairs where both values are valid
+        summary = prop.spatial["geometries"]["summary"]["coordinates"]
+        assert summary == [[40, -20], [35, 5]]
+
+    def test_no_valid_pairs(self):
+        # Each axis has a valid value, but no (lat, lon) pair is valid
+        sp = {"lat": [10, 95], "lon": [-200, 30]}
+        prop = Properties(filesystem={"path": "/path/to/eggs"}, spatial=sp,
+                          geometries=("bbox", "summary", "hull"))
+
+        assert prop.spatial["geometries"] == {
+            "bbox": {
+                "type": "MultiPoint",
+                "coordinates": [[30, 10], [30, 10], [30, 10], [30, 10]]
+            }
+        }
+
+    def test_unique_coords(self):
+        coords = Properties._unique_coords([1, 2, 1, 2], [3, 4, 3, 5])
+        assert coords.tolist() == [[1, 3], [2, 4], [2, 5]]
+        assert coords.dtype == np.float64
+
+        assert Properties._unique_coords([], []).shape == (0, 2)
+
+    def test_to_wkt(self):
+        spatial = {"lat": [1.5, 2, 1.5], "lon": [3, 4, 3]}
+        assert Properties._to_wkt(spatial) == \
+            "LINESTRING (1.500000 3.000000, 2.000000 4.000000)"
+        assert Properties._to_wkt({"lat": [], "lon": []}) == "LINESTRING ()"
+
+    def test_gen_id(self):
+        assert Properties._gen_id("/path/to/spam") == \
+            Properties._gen_id(u"/path/to/spam")
+        assert len(Properties._gen_id(u"/path/to/sp\xe4m")) == 40
+
+    def test_as_json(self):
+        doc = json.loads(self.prop.as_json())
+        assert doc["_id"] == Properties._gen_id("/path/to/spam")
+        assert doc["file"]["path"] == "/path/to/spam"
+        assert doc["misc"] == {"test": "foo"}
+
+    def test_as_json_floats(self):
+        sp = {"lat": [50.0, 50.4], "lon": [-1.0, -170.2979817]}
+        prop = Properties(filesystem={"path": "/path/to/eggs"}, spatial=sp)
+
+        doc = prop.as_json()
+        assert "50.4" in doc and "-170.2979817" in doc
+        assert "50.39999" not in doc
+
+        # Values of any magnitude must survive a round trip unchanged
+        misc = {"tiny": 1e-15, "small": 2.5e-13, "time": 345678.123456,
+                "big": 2 ** 70}
+        prop = Properties(filesystem={"path": "/path/to/eggs"}, **misc)
+        assert json.loads(prop.as_json())["misc"] == misc
+
+    def test_as_bytes(self):
+        assert isinstance(self.prop.as_bytes(), str)
+        assert json.loads(self.prop.as_bytes()) == \
+            json.loads(self.prop.as_json())
+
+    def test_gen_coord_summary(self):
+        spatial = {"lat": np.arange(100, dtype=np.float64),
+                   "lon": -np.arange(100, dtype=np.float64)}
+        coords = self.prop._gen_coord_summary(spatial)["coordinates"]
+        assert len(coords) == 30
+        assert coords[0] == [0, 0] and coords[-1] == [-99, 99]
+
+        spatial = {"lat": np.array([1.0, 2.0]), "lon": np.array([3.0, 4.0])}
+        assert self.prop._gen_coord_summary(spatial) == {
+            "type": "LineString",
+            "coordinates": [[3, 1], [4, 2]]
         }
 
+    def test_gen_hull(self):
+        coords = [(0, 0), (2, 0), (1, 1), (2, 2), (0, 2), (0.5, 1.5)]
+        hull = self.prop._gen_hull(coords)
+
+        self.check_ring(hull, [(0, 0), (0, 2), (2, 0), (2, 2)])
+
+    @unittest.skipIf(qconvex is None, "pyhull is not installed")
+    def test_gen_hull_pyhull(self):
+        coords = [(0, 0), (2, 0), (1, 1), (2, 2), (0, 2), (0.5, 1.5)]
+
+        # product only imports qconvex when scipy is missing
+        saved = product.ConvexHull, getattr(product, "qconvex", None)
+        product.ConvexHull, product.qconvex = None, qconvex
+        try:
+            hull = self.prop._gen_hull(coords)
+        finally:
+            product.ConvexHull, product.qconvex = saved
+            if saved[1] is None:
+                del product.qconvex
+
+        self.check_ring(hull, [(0, 0), (0, 2), (2, 0), (2, 2)])
+
+    @staticmethod
+    def check_ring(hull, vertices):
+        """Check 'hull' is a GeoJSON Polygon of one closed CCW ring"""
+        assert hull["type"] == "Polygon"
+        assert len(hull["coordinates"]) == 1
+
+        ring = np.array(hull["coordinates"][0])
+        assert ring[0].tolist() == ring[-1].tolist()
+        assert sorted(map(tuple, ring[:-1])) == vertices
+
+        # Shoelace formula: positive area means counter-clockwise
+        area = np.sum(ring[:-1, 0] * ring[1:, 1] - ring[1:, 0] * ring[:-1, 1])
+        assert area > 0
+
+    def test_thin_coords(self):
+        points = np.array([[0.001, 0.001], [0.002, 0.003], [-0.001, 0.001],
+                           [10.0, 20.0], [10.005, 20.005]])
+        thinned = Properties._thin_coords(points)
+
+        assert len(thinned) == 3
+        assert sorted(map(tuple, thinned)) == \
+            [(-0.001, 0.001), (0.001, 0.001), (10.0, 20.0)]
+
+    def test_slots(self):
+        with self.assertRaises(AttributeError):
+            self.prop.spam = "eggs"
+        with self.assertRaises(AttributeError):
+            Parameter("spam").eggs = "spam"
+
+    @unittest.skipIf(msgpack is None, "msgpack is not installed")
+    def test_as_msgpack(self):
+        doc = msgpack.unpackb(self.prop.as_msgpack(), raw=False)
+        assert doc == json.loads(self.prop.as_json())
 
+    def test_geometries(self):
+        sp = {"lat": [0, 0, 2, 2, 1], "lon": [0, 2, 2, 0, 1]}
+        prop = Properties(filesystem={"path": "/path/to/eggs"}, spatial=sp,
+                          geometries=("hull",))
+
+        geoms = prop.spatial["geometries"]
+        assert geoms.keys() == ["hull"]
+        self.check_ring(geoms["hull"], [(0, 0), (0, 2), (2, 0), (2, 2)])
+
+        assert sorted(self.prop.spatial["geometries"].keys()) == \
+            ["bbox", "summary"]
+
+        with self.assertRaises(ValueError):
+            Properties(filesystem={"path": "/path/to/eggs"},
+                       geometries=("spam",))
+
+    def test_ndarray_coords(self):
+        lats = np.array([10.0, 20.0, 30.0])
+        lons = np.array([40.0, 50.0, 60.0])
+        prop = Properties(filesystem={"path": "/path/to/eggs"},
+                          spatial={"lat": lats, "lon": lons})
+
+        bbox = prop.spatial["geometries"]["bbox"]["coordinates"]
+        assert bbox == [[40, 10], [40, 30], [60, 30], [60, 10]]
+
+    def test_hull_degenerate(self):
+        # Stationary: every fix is the same point
+        sp = {"lat": [51.5] * 50, "lon": [-1.25] * 50}
+        prop = Properties(filesystem={"path": "/path/to/eggs"}, spatial=sp,
+                          geometries=("hull",))
+        assert prop.spatial["geometries"]["hull"] == {
+            "type": "MultiPoint",
+            "coordinates": [[-1.25, 51.5]]
+        }
+
+        # Straight line along a parallel
+        sp = {"lat": [10.0] * 5, "lon": [3.0, 1.0, 5.0, 2.0, 4.0]}
+        prop = Properties(filesystem={"path": "/path/to/eggs"}, spatial=sp,
+                          geometries=("hull",))
+        assert prop.spatial["geometries"]["hull"] == {
+            "type": "MultiPoint",
+            "coordinates": [[1.0, 10.0], [5.0, 10.0]]
+        }
+
+        # Tracks along a parallel or meridian never reach Qhull
+        def no_hull(points):
+            raise AssertionError("ConvexHull called for a straight line")
+
+        convex_hull = product.ConvexHull
+        product.ConvexHull = no_hull
+        try:
+            sp = {"lat": [1.0, 2.0, 3.0, 4.0], "lon": [7.0] * 4}
+            prop = Properties(filesystem={"path": "/path/to/eggs"},
+                              spatial=sp, geometries=("hull",))
+        finally:
+            product.ConvexHull = convex_hull
+
+        assert prop.spatial["geometries"]["hull"] == {
+            "type": "MultiPoint",
+            "coordinates": [[7.0, 1.0], [7.0, 4.0]]
+        }
+
+        # Straight diagonal line
+        sp = {"lat": np.linspace(50, 51, 1000), "lon": np.linspace(-1, 0, 1000)}
+        prop = Properties(filesystem={"path": "/path/to/eggs"}, spatial=sp,
+                          geometries=("hull",))
+        assert prop.spatial["geometries"]["hull"] == {
+            "type": "MultiPoint",
+            "coordinates": [[-1.0, 50.0], [0.0, 51.0]]
+        }
+
+    def test_hull_thinned_collinear(self):
+        # Thinning keeps only the collinear corner points of each cell,
+        # but the full set of points does enclose an area
+        points = np.array([[0.001, 0.001], [0.011, 0.011], [0.021, 0.021],
+                           [0.031, 0.031], [0.0015, 0.0012]])
+        hull = self.prop._gen_hull(points)
+
+        self.check_ring(hull, [(0.001, 0.001), (0.0015, 0.0012),
+                               (0.031, 0.031)])
+
+    def test_hull_small_area(self):
+        # All points share one thinning grid cell
+        sp = {"lat": [0.001, 0.002, 0.002, 0.001, 0.0015],
+              "lon": [0.001, 0.001, 0.002, 0.002, 0.0015]}
+        prop = Properties(filesystem={"path": "/path/to/eggs"}, spatial=sp,
+                          geometries=("hull",))
+
+        hull = prop.spatial["geometries"]["hull"]
+        self.check_ring(hull, [(0.001, 0.001), (0.001, 0.002),
+                               (0.002, 0.001), (0.002, 0.002)])
+
+    def test_filter_coords_loop(self):
+        lats = np.array([10.0, 95.0, -20.0, 5.0, np.nan])
+        lons = np.array([-200.0, 30.0, 40.0, 35.0, 0.0])
+
+        for func in (product._filter_coords_loop, Properties._filter_coords):
+            out_lats, out_lons = func(lats, lons)
+            assert out_lats.tolist() == [-20.0, 5.0]
+            assert out_lons.tolist() == [40.0, 35.0]
+
+    @unittest.skipIf(product._filter_coords_jit is None,
+                     "numba is not installed")
+    def test_filter_coords_jit(self):
+        lats = np.linspace(-100, 100, product.JIT_FILTER_THRESHOLD)
+        lons = np.linspace(-200, 200, product.JIT_FILTER_THRESHOLD)
+
+        out_lats, out_lons = Properties._filter_coords(lats, lons)
+        valid = (np.abs(lats) <= 90) & (np.abs(lons) <= 180)
+        assert np.array_equal(out_lats, lats[valid])
+        assert np.array_equal(out_lons, lons[valid])
+
+    def test_filter_coords_2d(self):
+        # Multi-pixel rows, with more rows than the JIT threshold
+        shape = (product.JIT_FILTER_THRESHOLD * 2, 3)
+        lats = np.linspace(-100, 100, shape[0] * 3).reshape(shape)
+        lons = np.linspace(-200, 200, shape[0] * 3).reshape(shape)
+
+        out_lats, out_lons = Properties._filter_coords(lats, lons)
+        valid = (np.abs(lats) <= 90) & (np.abs(lons) <= 180)
+        assert np.array_equal(out_lats, lats[valid])
+        assert np.array_equal(out_lons, lons[valid])
+
+        prop = Properties(filesystem={"path": "/path/to/eggs"},
+                          spatial={"lat": lats, "lon": lons})
+        summary = prop.spatial["geometries"]["summary"]["coordinates"]
+        assert summary[0] == [out_lons[0], out_lats[0]]
+        assert summary[-1] == [out_lons[-1], out_lats[-1]]
+
+    def test_sanitize(self):
+        class Spam(object):
+            def __repr__(self):
+                return "spam"
+
+        obj = {
+            "a": (np.float64(1.5), np.int32(2), set([3])),
+            "b": datetime.datetime(2014, 9, 22, 20, 51, 53),
+            "c": np.array([[1, 2], [3, 4]]),
+            "d": [u"eggs", None, True, Spam()],
+        }
+
+        assert Properties._sanitize(obj) == {
+            "a": [1.5, 2, [3]],
+            "b": "2014-09-22T20:51:53",
+            "c": [[1, 2], [3, 4]],
+            "d": [u"eggs", None, True, "spam"],
+        }
+        assert type(Properties._sanitize(obj)["a"][1]) is int